@@ -0,0 +1,38 @@
+# Import required modules
+import asyncio  # For the condition variable guarding the counter
+
+
+# Concurrency limiter whose limit can be lowered at runtime (a Semaphore's
+# counter can't be safely resized once tasks are waiting on it)
+class Admission:
+    def __init__(self, cmax, cmin=1):
+        # Current limit of tasks allowed in at once, never lowered below cmin
+        self.cmax = cmax
+        self.cmin = cmin
+        # Number of tasks currently admitted
+        self.A = 0
+        self.cond = asyncio.Condition()
+
+    async def acquire(self):
+        """Wait until fewer than cmax tasks are admitted, then take a slot."""
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.A < self.cmax)
+            self.A += 1
+
+    async def release(self):
+        """Give a slot back and wake one waiting task."""
+        async with self.cond:
+            self.A -= 1
+            self.cond.notify(1)
+
+    async def shrink(self):
+        """Lower the limit by one (e.g. when the upstream signals overload)."""
+        async with self.cond:
+            self.cmax = max(self.cmin, self.cmax - 1)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
@@ -1,71 +1,112 @@
 import asyncio  # For running asynchronous operations
+import logging  # Lazy, level-aware progress messages
 import nest_asyncio  # To allow nested event loops (useful in interactive environments like Jupyter)
 import re  # Regular expressions, though unused in this snippet
 import json  # For JSON parsing/serialization if needed
+from urllib.parse import urljoin  # Resolve relative brand links
+import requests  # Plain HTTP fetch of the brand listing page
+from bs4 import BeautifulSoup  # HTML parsing for the plain HTTP path
 from playwright.async_api import async_playwright  # Playwright's async API for browser automation
-from DetailsScraper import DetailsScraping  # Custom module to scrape card details
+from DetailsScraper import DetailsScraping, CHROMIUM_ARGS, block_unneeded_resources  # Custom module to scrape card details
 from datetime import datetime, timedelta  # For handling date operations
 from dateutil.relativedelta import relativedelta  # Unused here, but useful for month/year date deltas
 
+# Module-level logger; handlers are configured by the entry-point scripts
+logger = logging.getLogger(__name__)
+
 # Define the scraper class for cards
 class CardScraper:
     def __init__(self, url):
         self.url = url  # The main URL to scrape brands from
         self.data = []  # Container to store all scraped data
+        self.max_concurrent_brands = 5  # Maximum number of brands scraped at once
+
+    # Fetch brand (title, href) pairs from the server-rendered HTML, without launching a browser
+    def fetch_brand_links(self):
+        try:
+            response = requests.get(self.url, timeout=15)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning("Plain HTTP fetch failed for %s: %s", self.url, e)
+            return []
+
+        # Parse the HTML and read the same brand anchors the browser path uses
+        soup = BeautifulSoup(response.text, 'html.parser')
+        return [(a.get('title'), a.get('href')) for a in soup.select('.styles_itemWrapper__MTzPB a')]
 
     # Asynchronous method to scrape all brands and their respective types/cards
     async def scrape_brands_and_types(self):
+        # Try the cheap plain-HTTP path first (in a thread so the event loop is not blocked)
+        raw_links = await asyncio.to_thread(self.fetch_brand_links)
+
         async with async_playwright() as p:
             # Launch a Chromium browser in headless mode (no GUI)
-            browser = await p.chromium.launch(headless=True)
-            # Open a new browser tab/page
-            page = await browser.new_page()
-            # Navigate to the initial URL
-            await page.goto(self.url)
+            browser = await p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+            # Share one browser context across all pages opened by this scraper
+            context = await browser.new_context()
+            # Skip images, fonts, stylesheets and media on every page of this context
+            await context.route('**/*', block_unneeded_resources)
+
+            # Only render the landing page when the static HTML had no brand links (client-side rendering)
+            if not raw_links:
+                # Open a new browser tab/page
+                page = await context.new_page()
+
+                # Navigate to the initial URL; the DOM is enough since only static links are read
+                await page.goto(self.url, wait_until='domcontentloaded', timeout=15000)
 
-            # Query all elements that match the brand links using their class selector
-            brand_elements = await page.query_selector_all('.styles_itemWrapper__MTzPB a')
+                # Read the title and href of every brand link in a single browser round trip
+                raw_links = await page.eval_on_selector_all(
+                    '.styles_itemWrapper__MTzPB a',
+                    "els => els.map(e => [e.getAttribute('title'), e.getAttribute('href')])"
+                )
+
+                # The landing page isn't needed anymore; brand pages get their own tabs
+                await page.close()
 
             # If no brands were found, print a message and return the empty data list
-            if not brand_elements:
-                print(f"No brand elements found on {self.url}")
+            if not raw_links:
+                logger.warning("No brand elements found on %s", self.url)
                 return self.data
 
-            # Loop through each brand element found
-            for element in brand_elements:
-                # Extract the title and href (relative or absolute link) of the brand
-                title = await element.get_attribute('title')
-                brand_link = await element.get_attribute('href')
-
+            # Build (title, full link, pagination template) for every brand that has a link
+            brand_pairs = []
+            for title, brand_link in raw_links:
                 if brand_link:
-                    # Construct the base URL (protocol + domain)
-                    base_url = self.url.split('/', 3)[0] + '//' + self.url.split('/', 3)[2]
-                    # Create the full URL if the brand_link is relative
-                    full_brand_link = base_url + brand_link if brand_link.startswith('/') else brand_link
+                    # Resolve relative links against the landing page URL
+                    full_brand_link = urljoin(self.url, brand_link)
+                    # Prepare the pagination template once per brand
+                    brand_link_template = full_brand_link.rsplit('/', 1)[0] + '/{}'
+                    brand_pairs.append((title, full_brand_link, brand_link_template))
 
-                    # Print the constructed brand link for debugging/logging
-                    print(f"Full brand link: {full_brand_link}")
+            # Bounds how many brands are scraped at once in the shared context
+            semaphore = asyncio.BoundedSemaphore(self.max_concurrent_brands)
 
-                    # Open a new tab to scrape card details for this specific brand
-                    new_page = await browser.new_page()
-                    await new_page.goto(full_brand_link)
+            # Scrape a single brand in its own tab of the shared context
+            async def scrape_one(title, full_brand_link, brand_link_template):
+                async with semaphore:
+                    # Print the constructed brand link for debugging/logging
+                    logger.debug("Full brand link: %s", full_brand_link)
 
-                    # Use the DetailsScraping class to fetch card-specific data
-                    details_scraper = DetailsScraping(full_brand_link)
+                    # Use the DetailsScraping class to fetch card-specific data on the shared browser context
+                    details_scraper = DetailsScraping(full_brand_link, browser=context)
                     card_details = await details_scraper.get_card_details()
-                    await new_page.close()  # Close the tab after scraping is done
 
-                    # Append structured data for this brand to the overall data list
-                    self.data.append({
-                        'brand_title': title,  # Name/title of the brand
-                        'brand_link': full_brand_link.rsplit('/', 1)[0] + '/{}',  # Prepare pagination template
-                        'available_cards': card_details,  # List of card details retrieved
-                    })
+                # Print brand info for tracking
+                logger.info("Found brand: %s, Link: %s", title, full_brand_link)
+
+                # Structured data for this brand
+                return {
+                    'brand_title': title,  # Name/title of the brand
+                    'brand_link': brand_link_template,  # Pagination template
+                    'available_cards': card_details,  # List of card details retrieved
+                }
 
-                    # Print brand info for tracking
-                    print(f"Found brand: {title}, Link: {full_brand_link}")
+            # Run all brands concurrently; gather keeps the original brand order
+            self.data = list(await asyncio.gather(*(scrape_one(*pair) for pair in brand_pairs)))
 
-            # Close the browser after finishing all operations
+            # Close the context (and any page still open) and then the browser
+            await context.close()
             await browser.close()
         
         # Return the collected data
@@ -1,103 +1,244 @@
-import pandas as pd
-import json
 import asyncio
 import nest_asyncio
+import random
 import re
-import json
-from playwright.async_api import async_playwright
+import threading
+import requests
+from bs4 import BeautifulSoup
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 
+# orjson parses the large __NEXT_DATA__ blob of every card page several times faster
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 # Allow nested event loops (useful in Jupyter)
 nest_asyncio.apply()
 
+# Resource types the scrapers never read; aborting them makes page loads much faster
+BLOCKED_RESOURCE_TYPES = {'image', 'font', 'stylesheet', 'media'}
+
+# Chromium switches that trim work a headless scraper never needs (GPU, extensions)
+# and avoid crashes from the small /dev/shm on CI runners
+CHROMIUM_ARGS = ['--disable-gpu', '--disable-extensions', '--disable-dev-shm-usage']
+
+# Reads every listing card's link, type, title and pin status in one in-browser pass,
+# instead of several Playwright round trips per card
+CARD_LIST_JS = '''cards => cards.map(card => {
+    const text = selector => {
+        const element = card.querySelector(selector);
+        return element ? element.innerText : null;
+    };
+    const tags = card.querySelector('.StackedCard_tags__SsKrH');
+    return {
+        href: card.getAttribute('href'),
+        type: text('.text-6-med.text-neutral_600.styles_category__NQAci'),
+        title: text('.text-4-med.text-neutral_900.styles_title__l5TTA.undefined'),
+        pinned: !!tags && tags.innerHTML.trim() !== '',
+    };
+})'''
+
+
+# Listing pages are server-rendered, so the card list can usually be read from the
+# plain HTML without a browser; each worker thread keeps one keep-alive session
+_http = threading.local()
+
+
+def _http_session():
+    session = getattr(_http, 'session', None)
+    if session is None:
+        session = _http.session = requests.Session()
+    return session
+
+
+# Same fields as CARD_LIST_JS, read from server-rendered HTML with BeautifulSoup
+def parse_card_list(html):
+    cards = []
+    for card in BeautifulSoup(html, 'html.parser').select('.StackedCard_card__Kvggc'):
+        type_element = card.select_one('.text-6-med.text-neutral_600.styles_category__NQAci')
+        title_element = card.select_one('.text-4-med.text-neutral_900.styles_title__l5TTA.undefined')
+        tags = card.select_one('.StackedCard_tags__SsKrH')
+        cards.append({
+            'href': card.get('href'),
+            'type': type_element.get_text(' ', strip=True) if type_element else None,
+            'title': title_element.get_text(' ', strip=True) if title_element else None,
+            'pinned': tags is not None and tags.decode_contents().strip() != '',
+        })
+    return cards
+
+
+# Statuses the site uses to push back on request bursts
+THROTTLED_STATUSES = (429, 503)
+
+
+# Seconds to wait after a throttled listing request: the server's Retry-After hint when
+# given, else full-jitter exponential backoff capped at a minute
+def throttle_delay(retry_after, attempt):
+    if retry_after and retry_after.isdigit():
+        return int(retry_after)
+    return random.uniform(0, min(60, 2 ** attempt))
+
+
+# Route handler that drops unneeded resources and lets everything else through
+async def block_unneeded_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
 class DetailsScraping:
-    def __init__(self, url, retries=3):
+    def __init__(self, url, retries=3, browser=None, on_throttled=None):
         self.url = url
         self.retries = retries  # Retry count for robustness
+        self.browser = browser  # Optional shared browser or context; one is launched per call when omitted
+        self.on_throttled = on_throttled  # Optional callback(status) fired when the site answers 429/503
+        self.empty_page_timeout = 5000  # ms to wait for listing cards after load before treating the page as empty
+
+    async def get_card_details(self, stop_when_older_than=None):
+        # stop_when_older_than ("YYYY-MM-DD"): stop visiting cards once an unpinned card is older than this date
+        # Reuse the injected browser so callers can share one Chromium across many pages
+        if self.browser is not None:
+            return await self._get_card_details(self.browser, stop_when_older_than)
 
-    async def get_card_details(self):
         async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
+            browser = await p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+            try:
+                return await self._get_card_details(browser, stop_when_older_than)
+            finally:
+                await browser.close()
+
+    @staticmethod
+    async def _new_page(browser):
+        # Open a tab that skips images, fonts, CSS and media; only the DOM text is scraped
+        page = await browser.new_page()
+        await page.route('**/*', block_unneeded_resources)
+        return page
+
+    def fetch_card_list(self):
+        """Read the listing cards over plain HTTP; returns (cards, status, Retry-After header).
+
+        cards is None when the HTML alone can't tell, and the page has to be rendered in the browser.
+        """
+        try:
+            response = _http_session().get(self.url, timeout=15)
+        except requests.RequestException as e:
+            print(f"Plain HTTP fetch failed for {self.url}: {e}")
+            return None, None, None
+        # Past the last page of a listing: nothing to scrape, no browser needed
+        if response.status_code in (404, 410):
+            return [], response.status_code, None
+        if response.status_code != 200:
+            return None, response.status_code, response.headers.get('Retry-After')
+        card_list = parse_card_list(response.text)
+        # No cards in the HTML proves nothing (client-rendered list, consent/bot page, changed
+        # selectors), so let the browser decide whether the page is really empty
+        if not card_list:
+            return None, response.status_code, None
+        return card_list, response.status_code, None
+
+    async def _get_card_details(self, browser, stop_when_older_than=None):
+        cards = []  # To store scraped cars
+
+        # Try the cheap plain-HTTP listing first and only render it in Chromium when the HTML can't tell
+        card_cards = None
+        for attempt in range(self.retries):
+            card_cards, status, retry_after = await asyncio.to_thread(self.fetch_card_list)
+            if status not in THROTTLED_STATUSES:
+                break
+            # Throttled: tell the caller, then wait as long as the server asks before trying again
+            if self.on_throttled:
+                self.on_throttled(status)
+            await asyncio.sleep(throttle_delay(retry_after, attempt))
+        if card_cards is not None:
+            try:
+                await self._scrape_cards(card_cards, browser, stop_when_older_than, cards)
+            except Exception as e:
+                print(f"Scraping cards failed for {self.url}: {e}. Returning partial results.")
+            return cards
+
+        for attempt in range(self.retries):
+            # A fresh tab per attempt, so a failed attempt leaves nothing behind
+            page = await self._new_page(browser)
 
             # Set timeouts
             page.set_default_navigation_timeout(30000)
             page.set_default_timeout(30000)  # General timeout
 
-            cards = []  # To store scraped cars
-
-            for attempt in range(self.retries):
+            try:
+                # Navigate to the page
+                response = await page.goto(self.url, wait_until="domcontentloaded")
+                # Let the caller know the site is pushing back, and back off before the next attempt
+                if response is not None and response.status in THROTTLED_STATUSES:
+                    if self.on_throttled:
+                        self.on_throttled(response.status)
+                    await asyncio.sleep(throttle_delay(response.headers.get('retry-after'), attempt))
+                    raise RuntimeError(f"HTTP {response.status}")
                 try:
-                    # Navigate to the page
-                    await page.goto(self.url, wait_until="domcontentloaded")
-                    await page.wait_for_selector('.StackedCard_card__Kvggc', timeout=30000)
-
-                    # Extract car details
-                    card_cards = await page.query_selector_all('.StackedCard_card__Kvggc')
-                    for card in card_cards:
-                        # Extract car information
-                        link = await self.scrape_link(card)
-                        card_type = await self.scrape_card_type(card)
-                        title = await self.scrape_title(card)
-                        pinned_today = await self.scrape_pinned_today(card)
-
-                        # Scrape scrape_more_details from the car page
-                        scrape_more_details = await self.scrape_more_details(link)
-
-                        cards.append({
-                            'id': scrape_more_details.get('id'),
-                            'date_published': scrape_more_details.get('date_published'),
-                            'relative_date': scrape_more_details.get('relative_date'),
-                            'pin': pinned_today,
-                            'type': card_type,
-                            'title': title,
-                            'description': scrape_more_details.get('description'),
-                            'link': link,
-                            'image': scrape_more_details.get('image'),
-                            'price': scrape_more_details.get('price'),
-                            'address': scrape_more_details.get('address'),
-                            'additional_details': scrape_more_details.get('additional_details'),
-                            'specifications': scrape_more_details.get('specifications'),
-                            'views_no': scrape_more_details.get('views_no'),  # Added views number here
-                            'submitter': scrape_more_details.get('submitter'),
-                            'ads': scrape_more_details.get('ads'),
-                            'membership': scrape_more_details.get('membership'),
-                            'phone': scrape_more_details.get('phone'),
-                        })
-                    break  # Exit loop if successful
-
-                except Exception as e:
-                    print(f"Attempt {attempt + 1} failed for {self.url}: {e}")
-                    if attempt + 1 == self.retries:
-                        print(f"Max retries reached for {self.url}. Returning partial results.")
-                        break
-                finally:
-                    # Close page between attempts to ensure proper cleanup
-                    await page.close()
-                    if attempt + 1 < self.retries:
-                        page = await browser.new_page()
-
-            await browser.close()
-            return cards
-
-    # Method to scrape the link
-    async def scrape_link(self, card):
-        rawlink = await card.get_attribute('href')
-        base_url = 'https://www.q84sale.com'
-        return f"{base_url}{rawlink}" if rawlink else None
+                    await page.wait_for_selector('.StackedCard_card__Kvggc', timeout=self.empty_page_timeout)
+                except PlaywrightTimeoutError:
+                    # The page loaded but shows no cards (e.g. past the last page): retrying won't change that
+                    print(f"No cards found on {self.url}")
+                    break
 
-    # Method to scrape the car type
-    async def scrape_card_type(self, card):
-        selector = '.text-6-med.text-neutral_600.styles_category__NQAci'
-        element = await card.query_selector(selector)
-        return await element.inner_text() if element else None
+                # Extract the list-level fields of all cards in a single evaluation
+                card_cards = await page.eval_on_selector_all('.StackedCard_card__Kvggc', CARD_LIST_JS)
+                await self._scrape_cards(card_cards, browser, stop_when_older_than, cards)
+                break  # Exit loop if successful
 
-    # Method to scrape the car title
-    async def scrape_title(self, card):
-        selector = '.text-4-med.text-neutral_900.styles_title__l5TTA.undefined'
-        element = await card.query_selector(selector)
-        return await element.inner_text() if element else None
+            except Exception as e:
+                print(f"Attempt {attempt + 1} failed for {self.url}: {e}")
+                if attempt + 1 == self.retries:
+                    print(f"Max retries reached for {self.url}. Returning partial results.")
+                    break
+            finally:
+                # Close the tab whether the attempt succeeded or not
+                await page.close()
+
+        return cards
+
+    async def _scrape_cards(self, card_cards, browser, stop_when_older_than, cards):
+        """Open each listed card's page and append its full record to cards."""
+        for card in card_cards:
+            # Extract car information
+            link = f"https://www.q84sale.com{card['href']}" if card['href'] else None
+            card_type = card['type']
+            title = card['title']
+            pinned_today = "Pinned today" if card['pinned'] else "Not Pinned"
+
+            # Scrape scrape_more_details from the car page (same browser, new tab)
+            scrape_more_details = await self.scrape_more_details(link, browser)
+
+            cards.append({
+                'id': scrape_more_details.get('id'),
+                'date_published': scrape_more_details.get('date_published'),
+                'relative_date': scrape_more_details.get('relative_date'),
+                'pin': pinned_today,
+                'type': card_type,
+                'title': title,
+                'description': scrape_more_details.get('description'),
+                'link': link,
+                'image': scrape_more_details.get('image'),
+                'price': scrape_more_details.get('price'),
+                'address': scrape_more_details.get('address'),
+                'additional_details': scrape_more_details.get('additional_details'),
+                'specifications': scrape_more_details.get('specifications'),
+                'views_no': scrape_more_details.get('views_no'),  # Added views number here
+                'submitter': scrape_more_details.get('submitter'),
+                'ads': scrape_more_details.get('ads'),
+                'membership': scrape_more_details.get('membership'),
+                'phone': scrape_more_details.get('phone'),
+            })
+
+            # Listings are newest first (apart from pinned cards), so once an unpinned card is
+            # older than the cutoff the rest of the page is older too and not worth opening.
+            # "YYYY-MM-DD HH:MM:SS" strings order like the dates they hold, so no parsing is needed
+            date_published = scrape_more_details.get('date_published')
+            if (stop_when_older_than and pinned_today != "Pinned today" and date_published
+                    and date_published < stop_when_older_than):
+                break
 
     # Method to scrape the car description
     async def scrape_description(self, page):
@@ -106,19 +247,6 @@ class DetailsScraping:
         element = await page.query_selector(selector)
         return await element.inner_text() if element else "No Description"
 
-    # Method to scrape the pin status
-    async def scrape_pinned_today(self, card):
-        selector = '.StackedCard_tags__SsKrH'
-        element = await card.query_selector(selector)
-
-        if element:
-            # Check if the div has any content or span inside it
-            content = await element.inner_html()
-            if content.strip() != "":
-                return "Pinned today"
-
-        return "Not Pinned"
-
     async def scrape_relative_date(self, page):
         try:
             # First try to get all data items
@@ -304,7 +432,7 @@ class DetailsScraping:
 
             if script_content:
                 # Parse the JSON data from the script content
-                data = json.loads(script_content.strip())
+                data = json_loads(script_content.strip())
 
                 # Navigate through the structure to find the phone number
                 phone_number = data.get("props", {}).get("pageProps", {}).get("listing", {}).get("phone", None)
@@ -359,57 +487,54 @@ class DetailsScraping:
         return {}
 
     # Method to scrape more_details
-    async def scrape_more_details(self, url):
+    async def scrape_more_details(self, url, browser):
         retries = 3  # Number of retries for robustness
         for attempt in range(retries):
+            # Open a new tab in the shared browser for this car detail scraping
+            page = await self._new_page(browser)
             try:
-                # Create a new page for this car detail scraping
-                async with async_playwright() as p:
-                    browser = await p.chromium.launch(headless=True)
-                    page = await browser.new_page()
-
-                    await page.goto(url, wait_until="domcontentloaded", timeout=60000)  # Increased timeout
-
-                    # Extract details using helper methods
-                    id = await self.scrape_id(page)
-                    description = await self.scrape_description(page)
-                    image = await self.scrape_image(page)
-                    price = await self.scrape_price(page)
-                    address = await self.scrape_address(page)
-                    additional_details = await self.scrape_additionalDetails_list(page)
-                    specifications = await self.scrape_specifications(page)
-                    views_no = await self.scrape_views_no(page)
-                    submitter_details = await self.scrape_submitter_details(page)
-                    phone = await self.scrape_phone_number(page)
-                    relative_date = await self.scrape_relative_date(page)
-                    date_published = await self.scrape_publish_date(relative_date) if relative_date else None
-
-                    # Consolidate details into a dictionary
-                    details = {
-                        'id': id,
-                        'description': description,
-                        'image': image,
-                        'price': price,
-                        'address': address,
-                        'additional_details': additional_details,
-                        'specifications': specifications,
-                        'views_no': views_no,
-                        'submitter': submitter_details.get('submitter'),
-                        'ads': submitter_details.get('ads'),
-                        'membership': submitter_details.get('membership'),
-                        'phone': phone,
-                        'relative_date': relative_date,
-                        'date_published': date_published,
-                    }
-
-                    await browser.close()
-                    return details
+                await page.goto(url, wait_until="domcontentloaded", timeout=60000)  # Increased timeout
+
+                # Extract details using helper methods
+                id = await self.scrape_id(page)
+                description = await self.scrape_description(page)
+                image = await self.scrape_image(page)
+                price = await self.scrape_price(page)
+                address = await self.scrape_address(page)
+                additional_details = await self.scrape_additionalDetails_list(page)
+                specifications = await self.scrape_specifications(page)
+                views_no = await self.scrape_views_no(page)
+                submitter_details = await self.scrape_submitter_details(page)
+                phone = await self.scrape_phone_number(page)
+                relative_date = await self.scrape_relative_date(page)
+                date_published = await self.scrape_publish_date(relative_date) if relative_date else None
+
+                # Consolidate details into a dictionary
+                details = {
+                    'id': id,
+                    'description': description,
+                    'image': image,
+                    'price': price,
+                    'address': address,
+                    'additional_details': additional_details,
+                    'specifications': specifications,
+                    'views_no': views_no,
+                    'submitter': submitter_details.get('submitter'),
+                    'ads': submitter_details.get('ads'),
+                    'membership': submitter_details.get('membership'),
+                    'phone': phone,
+                    'relative_date': relative_date,
+                    'date_published': date_published,
+                }
+
+                return details
 
             except Exception as e:
                 print(f"Error while scraping more details from {url}: {e}")
                 if attempt + 1 == retries:
                     print(f"Max retries reached for {url}. Returning partial results.")
                     return {}
+            finally:
+                await page.close()
 
         return {}
-
@@ -0,0 +1,51 @@
+# Import required modules
+import asyncio  # For running the blocking write in a worker thread
+from pathlib import Path  # For the output file path
+from typing import Dict, List, Tuple  # For type hints
+
+
+def cell_value(value):
+    """Convert a card value into something a spreadsheet or CSV cell can store."""
+    # Lists/dicts (e.g. additional_details, specifications) are stored as their text form
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def sheet_columns(rows: List[Dict]) -> List[str]:
+    """Header row covering every row's keys, in first-seen order."""
+    return list(dict.fromkeys(key for row in rows for key in row))
+
+
+def write_xlsx(excel_file: Path, sheets: List[Tuple[str, List[Dict]]]):
+    """Write (sheet name, rows) pairs to an .xlsx file, one row at a time."""
+    # xlsxwriter is imported here so runs with nothing to save never pay for loading it
+    import xlsxwriter
+
+    # constant_memory flushes each row as soon as the next one starts, so rows must be
+    # written strictly top to bottom (pandas writes column by column, which loses data here)
+    workbook = xlsxwriter.Workbook(str(excel_file), {'constant_memory': True, 'strings_to_urls': False})
+    try:
+        used_names = set()
+        for sheet_name, rows in sheets:
+            # Excel caps sheet names at 31 characters and compares them case-insensitively,
+            # so names that clash get a numeric suffix instead
+            sheet_name = sheet_name[:31] or "Sheet"
+            base_name, suffix = sheet_name, 1
+            while sheet_name.lower() in used_names:
+                suffix += 1
+                sheet_name = f"{base_name[:31 - len(str(suffix)) - 1]}_{suffix}"
+            used_names.add(sheet_name.lower())
+
+            worksheet = workbook.add_worksheet(sheet_name)
+            columns = sheet_columns(rows)
+            worksheet.write_row(0, 0, columns)
+            for row_index, row in enumerate(rows, start=1):
+                worksheet.write_row(row_index, 0, [cell_value(row.get(column)) for column in columns])
+    finally:
+        workbook.close()
+
+
+async def save_to_excel_async(excel_file: Path, sheets: List[Tuple[str, List[Dict]]]):
+    """Write the workbook in a thread so scraping and uploads keep running meanwhile."""
+    await asyncio.to_thread(write_xlsx, excel_file, sheets)
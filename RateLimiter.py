@@ -0,0 +1,24 @@
+# Import required modules
+import asyncio  # For the event loop clock, lock and sleeps
+
+
+# Spaces out requests to one host so they never exceed a fixed rate,
+# without making callers wait when the budget isn't used up
+class HostRateLimiter:
+    def __init__(self, rps):
+        # Minimum time between two consecutive requests, in seconds
+        self._interval = 1 / rps
+        # Event loop time at which the next request may start
+        self._next = 0.0
+        # Serializes slot reservations between concurrent callers
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until the next request slot for this host is available."""
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            wait = max(0.0, self._next - now)
+            # Reserve the slot before sleeping so later callers queue up behind it
+            self._next = max(now, self._next) + self._interval
+        # Sleep outside the lock; the slot is already ours
+        await asyncio.sleep(wait)
@@ -0,0 +1,393 @@
+# Import required modules
+import os  # For file path operations
+import logging  # For lazy, level-aware log messages
+import io  # For streaming file reads during upload
+import gzip  # To compress text output before upload
+import shutil  # To copy file content into the gzip stream
+import mimetypes  # To set the upload MIME type explicitly
+from google.oauth2.service_account import Credentials  # For Google API authentication using service accounts
+from google.auth.transport.requests import Request  # Transport used to refresh access tokens
+from googleapiclient.discovery import build  # To build the Google Drive API service
+from googleapiclient.http import MediaIoBaseUpload  # To stream file content to Google Drive
+from googleapiclient.errors import HttpError  # Raised by the Drive API on error responses
+from google_auth_httplib2 import AuthorizedHttp  # Authorized HTTP transport reused across calls
+import httplib2  # Underlying keep-alive HTTP client
+from datetime import date, timedelta  # For handling dates
+from functools import lru_cache  # To memoize the date folder name per day
+import time  # For expiring cached folder IDs
+import threading  # For the shared folder ID cache lock and per-thread Drive services
+from concurrent.futures import ThreadPoolExecutor  # To upload several files in parallel
+from tenacity import retry, stop_after_attempt, wait_exponential, wait_random, retry_if_exception  # Retry helpers
+
+# Module-level logger; handlers are configured by the entry-point scripts
+logger = logging.getLogger(__name__)
+
+# Folder IDs already resolved in this process, keyed by (parent_folder_id, folder_name)
+# Each entry holds (folder_id, expires_at) so IDs of folders removed on Drive eventually age out
+_folder_id_cache = {}
+_folder_id_cache_lock = threading.Lock()
+# How long (in seconds) a cached folder ID stays valid
+_FOLDER_ID_CACHE_TTL = 60 * 60
+
+
+def _get_cached_folder_id(parent_folder_id, folder_name):
+    """Return a cached folder ID, or None when missing or expired."""
+    with _folder_id_cache_lock:
+        entry = _folder_id_cache.get((parent_folder_id, folder_name))
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        _folder_id_cache.pop((parent_folder_id, folder_name), None)
+        return None
+
+
+def _cache_folder_id(parent_folder_id, folder_name, folder_id):
+    """Store a resolved folder ID in the process-wide cache."""
+    with _folder_id_cache_lock:
+        expires_at = time.monotonic() + _FOLDER_ID_CACHE_TTL
+        _folder_id_cache[(parent_folder_id, folder_name)] = (folder_id, expires_at)
+
+
+@lru_cache(maxsize=2)
+def _yesterday_for(today):
+    """Return the 'YYYY-MM-DD' string for the day before the given date."""
+    return (today - timedelta(days=1)).isoformat()
+
+
+# HTTP statuses from Drive that are worth retrying (rate limits and transient server errors);
+# 403 is only retried when its reason is a rate limit, see is_drive_rate_limit
+_RETRYABLE_STATUSES = (429, 500, 503)
+# 403 reasons Drive uses for rate limits; others (storageQuotaExceeded, insufficientFilePermissions,
+# domainPolicy, ...) are permanent and must fail right away
+_RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+# Exponential backoff with jitter, used when the server gives no Retry-After hint
+_drive_backoff = wait_exponential(multiplier=1, max=60) + wait_random(0, 2)
+
+
+def is_drive_rate_limit(exception):
+    """Return True for a Drive 429, or a 403 whose reason is a rate limit."""
+    if not isinstance(exception, HttpError):
+        return False
+    if exception.resp.status == 429:
+        return True
+    if exception.resp.status != 403:
+        return False
+    # error_details holds the response's "errors" list (dicts with a 'reason') or, failing that, a message
+    details = getattr(exception, 'error_details', None) or ''
+    if isinstance(details, list):
+        return any(isinstance(detail, dict) and detail.get('reason') in _RATE_LIMIT_REASONS for detail in details)
+    return any(reason in str(details) for reason in _RATE_LIMIT_REASONS)
+
+
+def _is_retryable_drive_error(exception):
+    """Return True for Drive errors caused by rate limiting or transient server failures."""
+    return isinstance(exception, HttpError) and (
+        exception.resp.status in _RETRYABLE_STATUSES or is_drive_rate_limit(exception))
+
+
+def _wait_for_drive_retry(retry_state):
+    """Honor the server's Retry-After header, falling back to exponential backoff with jitter."""
+    retry_after = retry_state.outcome.exception().resp.get('retry-after')
+    if retry_after and retry_after.isdigit():
+        return int(retry_after)
+    return _drive_backoff(retry_state)
+
+
+def _log_drive_retry(retry_state):
+    """Log a warning before sleeping between Drive retries."""
+    logger.warning("Drive request failed (%s), retrying in %.1f seconds...",
+                   retry_state.outcome.exception(), retry_state.next_action.sleep)
+
+
+# Shared Google Drive saving logic; subclasses only choose the parent folder
+class SavingOnDriveBase:
+    def __init__(self, credentials_dict, parent_folder_id, scraper_tag):
+        # Initialize with credentials dictionary provided from environment or secure storage
+        self.credentials_dict = credentials_dict
+        
+        # Define the required scope for accessing Google Drive
+        self.scopes = ['https://www.googleapis.com/auth/drive']
+        
+        # This will hold the authenticated Google Drive service object
+        self.service = None
+
+        # Credentials kept after authentication so worker threads can build their own service
+        self.creds = None
+
+        # Number of files uploaded in parallel (kept low to respect Drive's per-user write quota)
+        self.upload_workers = 4
+
+        # Files larger than this (in bytes) use a resumable upload; smaller ones go in one request
+        self.resumable_threshold = 5 * 1024 * 1024
+
+        # Chunk size (in bytes) for resumable uploads; large chunks mean fewer round trips per file
+        self.upload_chunksize = 16 * 1024 * 1024
+
+        # Plain-text file types that are gzipped before upload (.xlsx is already compressed)
+        self.compressible_extensions = {'.csv', '.json', '.txt'}
+
+        # Per-thread storage for Drive services (service objects are not thread-safe)
+        self._thread_local = threading.local()
+
+        # Upload worker pool kept for the saver's lifetime so each worker's connection stays warm
+        self._upload_executor = None
+        
+        # ID of the parent folder in Google Drive where all subfolders/files will be created/uploaded
+        self.parent_folder_id = parent_folder_id
+
+        # Value of the 'scraper' app property set on the folders this saver creates
+        self.scraper_tag = scraper_tag
+
+    def authenticate(self):
+        """Authenticate with Google Drive API using service account credentials."""
+        try:
+            logger.info("Authenticating with Google Drive...")
+            
+            # Load credentials from the provided service account dictionary and apply the scopes
+            creds = Credentials.from_service_account_info(self.credentials_dict, scopes=self.scopes)
+            self.creds = creds
+
+            # Drop per-thread services built from older credentials
+            self._thread_local = threading.local()
+            
+            # Build the Drive API client on a persistent authorized connection
+            self.service = self._build_service()
+            logger.info("Authentication successful.")
+        except Exception as e:
+            # Handle and raise any authentication errors
+            logger.error("Authentication error: %s", e)
+            raise
+
+    def refresh_token(self):
+        """Refresh the OAuth access token in place, keeping the existing Drive services."""
+        # Every service's AuthorizedHttp shares these credentials, so they all pick up the new token
+        self.creds.refresh(Request())
+        logger.info("Access token refreshed.")
+
+    # Retry rate-limited and transient Drive errors with backoff
+    @retry(retry=retry_if_exception(_is_retryable_drive_error),
+           stop=stop_after_attempt(6),
+           wait=_wait_for_drive_retry,
+           before_sleep=_log_drive_retry,
+           reraise=True)
+    def _execute(self, request):
+        """Execute a Drive API request, retrying rate limits and transient server errors."""
+        return request.execute()
+
+    def get_folder_id(self, folder_name):
+        """Get the ID of a folder with the given name under the specified parent folder."""
+        # Serve the ID from the process-wide cache when it was already resolved
+        cached_id = _get_cached_folder_id(self.parent_folder_id, folder_name)
+        if cached_id:
+            logger.debug("Folder '%s' found in cache with ID: %s", folder_name, cached_id)
+            return cached_id
+
+        # Otherwise look it up on Drive
+        folder_id = self.get_folder_ids([folder_name]).get(folder_name)
+        if folder_id:
+            logger.info("Folder '%s' found with ID: %s", folder_name, folder_id)
+        else:
+            # Folder not found
+            logger.info("Folder '%s' does not exist.", folder_name)
+        return folder_id
+
+    def get_folder_ids(self, folder_names):
+        """Get the IDs of several folders under the parent folder with a single list query."""
+        try:
+            # Match folders tagged by this scraper for any requested date, in one query.
+            # The name clause still finds folders created before tagging was introduced.
+            tag_clause = f"appProperties has {{ key='scraper' and value='{self.scraper_tag}' }}"
+            folder_clauses = " or ".join(
+                "(appProperties has {{ key='date' and value='{0}' }} and {1}) or name='{0}'".format(
+                    name.replace("'", "\\'"), tag_clause)
+                for name in folder_names
+            )
+            query = (f"({folder_clauses}) and "
+                     f"'{self.parent_folder_id}' in parents and "
+                     f"mimeType='application/vnd.google-apps.folder' and "
+                     f"trashed=false")
+            
+            # Execute the query to search for the folders
+            results = self._execute(self.service.files().list(
+                q=query,
+                spaces='drive',
+                fields='files(id, name)'  # Only return id and name fields
+            ))
+            
+            # Map each found folder name to its ID (first match wins)
+            folder_ids = {}
+            for file in results.get('files', []):
+                folder_ids.setdefault(file['name'], file['id'])
+
+            # Remember the resolved IDs for later lookups
+            for name, folder_id in folder_ids.items():
+                _cache_folder_id(self.parent_folder_id, name, folder_id)
+            return folder_ids
+        except Exception as e:
+            # Handle any error during folder search
+            logger.error("Error getting folder ID: %s", e)
+            return {}
+
+    def create_folder(self, folder_name):
+        """Create a new folder under the parent folder and return its ID."""
+        try:
+            logger.info("Creating folder '%s'...", folder_name)
+            
+            # Define the metadata for the folder to be created
+            file_metadata = {
+                'name': folder_name,
+                'mimeType': 'application/vnd.google-apps.folder',  # Specifies it's a folder
+                'parents': [self.parent_folder_id],  # Place it under the parent folder
+                # Tag the folder so later lookups can search by property instead of by name
+                'appProperties': {'scraper': self.scraper_tag, 'date': folder_name}
+            }
+            
+            # Call the Drive API to create the folder
+            folder = self._execute(self.service.files().create(
+                body=file_metadata,
+                fields='id'  # Only retrieve the ID of the newly created folder
+            ))
+            
+            # Log and return the new folder's ID
+            logger.info("Folder '%s' created with ID: %s", folder_name, folder.get('id'))
+            # Cache the new folder so later lookups skip the Drive query
+            _cache_folder_id(self.parent_folder_id, folder_name, folder.get('id'))
+            return folder.get('id')
+        except Exception as e:
+            # Handle any error during folder creation
+            logger.error("Error creating folder: %s", e)
+            raise
+
+    def ensure_folder(self, folder_name):
+        """Return the ID of the named folder under the parent folder, creating it if needed."""
+        # get_folder_id serves repeated calls from the folder ID cache, so this is one Drive lookup per run
+        folder_id = self.get_folder_id(folder_name)
+        if not folder_id:
+            folder_id = self.create_folder(folder_name)
+        return folder_id
+
+    def upload_file(self, file_name, folder_id, retry_transient=True):
+        """Upload a single file to the specified folder in Google Drive (safe to call from any thread)."""
+        # retry_transient=False sends the upload once and leaves 429/5xx handling to a caller
+        # that has its own retry loop, so failures aren't retried by two layers at once
+        try:
+            logger.debug("Uploading file: %s", file_name)
+            
+            # Prepare the metadata for the file including its name and parent folder
+            file_metadata = {
+                'name': os.path.basename(file_name),  # Use only the file name (no path)
+                'parents': [folder_id]  # Upload to the given folder
+            }
+            
+            # guess_type splits "x.csv.gz" into ('text/csv', 'gzip'); the bytes are gzip, so say so
+            mimetype, encoding = mimetypes.guess_type(file_name)
+            if encoding == 'gzip':
+                mimetype = 'application/gzip'
+            mimetype = mimetype or 'application/octet-stream'
+            service = self._thread_service()
+            
+            # Uncompressed files are streamed from disk in chunks; text files are gzipped into memory first
+            with io.FileIO(file_name, 'rb') as file_stream:
+                if os.path.splitext(file_name)[1].lower() in self.compressible_extensions:
+                    # Plain-text output shrinks a lot, so upload a gzipped copy instead
+                    upload_stream = self._gzip_stream(file_stream)
+                    upload_size = upload_stream.getbuffer().nbytes
+                    file_metadata['name'] += '.gz'
+                    mimetype = 'application/gzip'
+                else:
+                    # The size comes from the open descriptor, so no separate stat of the path is needed
+                    upload_stream = file_stream
+                    upload_size = os.fstat(file_stream.fileno()).st_size
+
+                # Small files are sent in a single multipart request; only large ones need a resumable session
+                resumable = upload_size > self.resumable_threshold
+                media = MediaIoBaseUpload(upload_stream, mimetype=mimetype,
+                                          chunksize=self.upload_chunksize, resumable=resumable)
+                
+                # Upload the file to Drive using the calling thread's own service
+                request = service.files().create(
+                    body=file_metadata,
+                    media_body=media,
+                    fields='id'  # Only return the file ID
+                )
+                file = self._execute(request) if retry_transient else request.execute()
+            
+            # Log the successful upload
+            logger.debug("File '%s' uploaded with ID: %s", file_name, file.get('id'))
+            return file.get('id')
+        except FileNotFoundError:
+            # Let callers decide how to treat a missing local file
+            raise
+        except Exception as e:
+            # Handle any error during file upload
+            logger.error("Error uploading file: %s", e)
+            raise
+
+    @staticmethod
+    def _gzip_stream(file_stream):
+        """Compress an open file into an in-memory gzip buffer positioned at its start."""
+        buffer = io.BytesIO()
+        # Level 1 favors speed; text output still compresses several times over
+        with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=1) as gzip_file:
+            shutil.copyfileobj(file_stream, gzip_file)
+        buffer.seek(0)
+        return buffer
+
+    def _build_service(self):
+        """Build a Drive service bound to its own keep-alive authorized HTTP connection."""
+        # One Http object per service keeps the TLS connection open across calls
+        http = AuthorizedHttp(self.creds, http=httplib2.Http(timeout=60))
+        # Use the discovery document bundled with the client library instead of fetching it
+        return build('drive', 'v3', http=http, static_discovery=True, cache_discovery=False)
+
+    def _thread_service(self):
+        """Return a Drive service owned by the current thread, building it on first use."""
+        service = getattr(self._thread_local, 'service', None)
+        if service is None:
+            # Each worker thread gets its own client since service objects are not thread-safe
+            service = self._build_service()
+            self._thread_local.service = service
+        return service
+
+    def _get_upload_executor(self):
+        """Return the shared upload thread pool, creating it on first use."""
+        # Reusing the same worker threads lets their keep-alive Drive connections
+        # carry over between save_files calls instead of reconnecting every time
+        if self._upload_executor is None:
+            self._upload_executor = ThreadPoolExecutor(max_workers=self.upload_workers,
+                                                       thread_name_prefix='drive-upload')
+        return self._upload_executor
+
+    def _upload_one(self, file_name, folder_id):
+        """Upload a single file from a worker thread, skipping files that no longer exist."""
+        try:
+            return self.upload_file(file_name, folder_id)
+        except FileNotFoundError:
+            # A file that vanished locally is skipped rather than failing the whole batch
+            logger.warning("Skipping missing file: %s", file_name)
+            return None
+
+    @staticmethod
+    def _yesterday():
+        """Return yesterday's date as 'YYYY-MM-DD', computed once per calendar day."""
+        # Keyed on today's date so the value rolls over at midnight
+        return _yesterday_for(date.today())
+
+    def save_files(self, files):
+        """Save a list of files to Google Drive in a folder named after yesterday's date."""
+        try:
+            # Yesterday's date formatted as 'YYYY-MM-DD'
+            yesterday = self._yesterday()
+            
+            # Get the folder for yesterday, creating it if it doesn't exist yet
+            folder_id = self.ensure_folder(yesterday)
+            
+            # Upload the files in parallel; list() surfaces any upload error
+            executor = self._get_upload_executor()
+            list(executor.map(lambda file_name: self._upload_one(file_name, folder_id), files))
+            
+            # Log final success message
+            logger.info("All files uploaded successfully to Google Drive folder '%s'.", yesterday)
+        except Exception as e:
+            # Handle any error during the process
+            logger.error("Error saving files: %s", e)
+            raise
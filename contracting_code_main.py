@@ -1,16 +1,62 @@
 # Required imports for async operations, data handling, file ops, logging, and date/time.
 import asyncio
-import pandas as pd
+import csv
+import gzip
+import io
 import os
-import json
 import logging
+import random
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple
 from pathlib import Path
+from googleapiclient.errors import HttpError
+from playwright.async_api import async_playwright
+
+# Prefer orjson for parsing JSON, falling back to the standard library
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 # Custom scraping and Drive-saving classes (assumed implemented elsewhere).
-from DetailsScraper import DetailsScraping
+from DetailsScraper import DetailsScraping, CHROMIUM_ARGS
+from RateLimiter import HostRateLimiter
+from Admission import Admission
+from ExcelWriter import cell_value
 from SavingOnDriveContracting import SavingOnDriveContracting
+from SavingOnDriveBase import is_drive_rate_limit
+
+
+# Streams card rows into a gzipped CSV file as pages are scraped, so a category's cards
+# never have to be held in memory all at once
+class CardTableWriter:
+    def __init__(self, table_file: Path):
+        self.table_file = table_file
+        self.rows = 0  # Number of card rows written so far
+        self._file = None  # Opened on the first row, so empty categories leave no file behind
+        self._writer = None
+        self._columns = None
+
+    def write(self, cards: List[Dict]):
+        """Append a batch of cards, writing the header row first if this is the first batch."""
+        if not cards:
+            return
+        if self._file is None:
+            # newline='' lets the csv module control line endings inside the gzip stream
+            self._file = io.TextIOWrapper(gzip.GzipFile(self.table_file, "wb"),
+                                          encoding="utf-8", newline="")
+            self._writer = csv.writer(self._file)
+            # Header row from the first card's keys, in their scraped order
+            self._columns = list(cards[0].keys())
+            self._writer.writerow(self._columns)
+        columns = self._columns
+        self._writer.writerows([cell_value(card.get(column)) for column in columns] for card in cards)
+        self.rows += len(cards)
+
+    def close(self):
+        """Flush and close the file if any row was written."""
+        if self._file is not None:
+            self._file.close()
 
 
 # Main class for scraping contracting service listings and saving to Google Drive
@@ -19,10 +65,7 @@ class ContractingMainScraper:
         # Dictionary of categories and their associated (url_template, page_count) list
         self.contractingANDservices_data = contractingANDservices_data
         
-        # Number of categories to process at once (chunked)
-        self.chunk_size = 2
-        
-        # Maximum concurrent URLs to scrape at a time
+        # Number of categories scraped at the same time (one worker per category)
         self.max_concurrent_links = 2
         
         # Set up logger instance
@@ -31,111 +74,199 @@ class ContractingMainScraper:
         # Configure logger (file + console)
         self.setup_logging()
         
-        # Directory for storing temporary Excel files
+        # Directory for storing temporary output files
         self.temp_dir = Path("temp_files")
         self.temp_dir.mkdir(exist_ok=True)  # Create directory if it doesn't exist
         
         # Number of retry attempts for failed uploads
         self.upload_retries = 3
         
-        # Delay (in seconds) between upload retries
-        self.upload_retry_delay = 15
+        # Upper bound (in seconds) for the exponential backoff between upload retries
+        self.upload_retry_max_delay = 60
         
-        # Delay between scraping each page
-        self.page_delay = 3
+        # Maximum number of files uploaded to Google Drive at the same time
+        self.upload_concurrency = 4
+        # Admission limit for uploads; lowered whenever Drive answers 429
+        self.upload_admission = Admission(self.upload_concurrency)
         
-        # Delay between scraping chunks
-        self.chunk_delay = 10
+        # Maximum listing pages fetched at once from q84sale.com (shared by all categories)
+        self.max_concurrent_pages = 3
+        self.page_semaphore = asyncio.Semaphore(self.max_concurrent_pages)
+
+        # Listing page requests per second allowed to q84sale.com across all categories
+        self.requests_per_second = 3
+        self.rate_limiter = HostRateLimiter(self.requests_per_second)
+
+        # Date being scraped ("YYYY-MM-DD"), computed once per run instead of per page/card
+        self._yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+
 
     def setup_logging(self):
         """Initialize logging configuration to output to file and console."""
-        stream_handler = logging.StreamHandler()
-        file_handler = logging.FileHandler("scraper.log")
-
-        # Basic logging setup
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(asctime)s - %(levelname)s - %(message)s",
-            handlers=[stream_handler, file_handler],
-        )
+        # Only the first scraper in the process configures the root logger; later ones would
+        # just open a scraper.log handle that basicConfig ignores
+        if not logging.getLogger().handlers:
+            stream_handler = logging.StreamHandler()
+            file_handler = logging.FileHandler("scraper.log", delay=True)  # Opened on the first record
+
+            # Basic logging setup
+            logging.basicConfig(
+                level=logging.INFO,
+                format="%(asctime)s - %(levelname)s - %(message)s",
+                handlers=[stream_handler, file_handler],
+            )
         self.logger.setLevel(logging.INFO)
         print("Logging setup complete.")
 
-    async def scrape_contractingANDservice(self, contractingANDservice_name: str, urls: List[Tuple[str, int]], semaphore: asyncio.Semaphore) -> List[Dict]:
-        """Scrape data for a single contracting category."""
+    async def scrape_contractingANDservice(self, contractingANDservice_name: str, urls: List[Tuple[str, int]]) -> str:
+        """Scrape a contracting category, streaming yesterday's cards to a gzipped CSV; return its path or None."""
         self.logger.info(f"Starting to scrape {contractingANDservice_name}")
-        card_data = []  # Store valid scraped cards
-        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-
-        async with semaphore:
-            # Loop through all URL templates for this category
-            for url_template, page_count in urls:
-                # Scrape each page in the given range
-                for page in range(1, page_count + 1):
-                    url = url_template.format(page)
-                    scraper = DetailsScraping(url)
-                    try:
-                        # Extract card details from the page
-                        cards = await scraper.get_card_details()
-                        
-                        # Filter only cards published yesterday
-                        for card in cards:
-                            if card.get("date_published") and card.get("date_published", "").split()[0] == yesterday:
-                                card_data.append(card)
-
-                        # Wait to prevent rate-limiting
-                        await asyncio.sleep(self.page_delay)
-                    except Exception as e:
-                        self.logger.error(f"Error scraping {url}: {e}")
-                        continue
-
-        return card_data
-
-    async def save_to_excel(self, contractingANDservice_name: str, card_data: List[Dict]) -> str:
-        """Save scraped card data to an Excel file."""
-        if not card_data:
-            self.logger.info(f"No data to save for {contractingANDservice_name}, skipping Excel file creation.")
-            return None
+        # Gzipped CSV is far cheaper to write than .xlsx and several times smaller to upload
+        table_file = Path(f"{contractingANDservice_name}.csv.gz")
+        table = CardTableWriter(table_file)
 
-        excel_file = Path(f"{contractingANDservice_name}.xlsx")
         try:
-            # Convert data to DataFrame and save as Excel
-            df = pd.DataFrame(card_data)
-            df.to_excel(excel_file, index=False)
-            self.logger.info(f"Successfully saved data for {contractingANDservice_name}")
-            return str(excel_file)
-        except Exception as e:
-            self.logger.error(f"Error saving Excel file {excel_file}: {e}")
+            async with async_playwright() as p:
+                # One browser per category, shared by all of its pages and card detail tabs
+                browser = await p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+                try:
+                    # URL templates are walked concurrently; the page semaphore caps how many
+                    # requests hit the site at once
+                    await asyncio.gather(*(
+                        self._scrape_template(url_template, page_count, browser, table)
+                        for url_template, page_count in urls
+                    ))
+                finally:
+                    await browser.close()
+        finally:
+            table.close()
+
+        if not table.rows:
+            self.logger.info(f"No data to save for {contractingANDservice_name}, skipping file creation.")
             return None
 
+        self.logger.info(f"Successfully saved {table.rows} cards for {contractingANDservice_name}")
+        return str(table_file)
+
+    async def _scrape_template(self, url_template: str, page_count: int, browser, table: CardTableWriter):
+        """Scrape the pages of one URL template, writing the cards published yesterday to the table."""
+        yesterday = self._yesterday
+
+        if page_count < 1:
+            return
+
+        # Page 1 goes first: when it already reaches cards older than yesterday, the later pages
+        # (sorted newest first) can't hold anything from yesterday and are never requested
+        first_page = await self._scrape_page(url_template.format(1), browser)
+        pages = [first_page]
+        if not self._reaches_older(first_page):
+            # Otherwise the remaining pages are fetched at once; the page semaphore and rate limiter
+            # still bound the load, and each page stops at its first older unpinned card
+            pages += await asyncio.gather(*(
+                self._scrape_page(url_template.format(page), browser)
+                for page in range(2, page_count + 1)
+            ))
+
+        for cards in pages:
+            # Dates look like "YYYY-MM-DD HH:MM:SS"; a prefix check avoids splitting every date string
+            matched = [card for card in cards if (card.get("date_published") or "").startswith(yesterday)]
+
+            # A page's worth of rows is tiny, so it is written right here on the event loop;
+            # keeping writes on one thread also keeps concurrent templates from interleaving rows
+            table.write(matched)
+
+    def _is_older(self, card: Dict) -> bool:
+        """True for an unpinned card published before yesterday."""
+        date_published = card.get("date_published")
+        # Plain string order matches date order for "YYYY-MM-DD..." and needs no slice.
+        # Pinned cards sit on top regardless of age, so an old pinned ad says nothing about later pages
+        return bool(date_published) and date_published < self._yesterday and card.get("pin") != "Pinned today"
+
+    def _reaches_older(self, cards: List[Dict]) -> bool:
+        """True when a page already lists cards older than yesterday, so later pages can be skipped."""
+        return any(self._is_older(card) for card in cards)
+
+    async def _scrape_page(self, url: str, browser) -> List[Dict]:
+        """Scrape the cards of a single listing page, returning an empty list on failure."""
+        async with self.page_semaphore:
+            # Only waits when the shared per-host request budget is used up
+            await self.rate_limiter.acquire()
+            scraper = DetailsScraping(url, browser=browser)
+            try:
+                # Extract card details from the page, skipping cards past the first one older than yesterday
+                return await scraper.get_card_details(stop_when_older_than=self._yesterday)
+            except Exception as e:
+                self.logger.error(f"Error scraping {url}: {e}")
+                return []
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter for the given (zero-based) retry attempt."""
+        return min(2 ** attempt + random.random(), self.upload_retry_max_delay)
+
+    async def _upload_one(self, drive_saver, file: str, folder_id: str) -> bool:
+        """Upload a single file from a worker thread, retrying transient failures."""
+        async with self.upload_admission:
+            # Retry upload attempts
+            for attempt in range(self.upload_retries):
+                try:
+                    # The Drive client is blocking, so run it off the event loop. This loop is the only
+                    # retry layer for the upload, so a 429 reaches it right away and can shrink admission
+                    await asyncio.to_thread(drive_saver.upload_file, file, folder_id, retry_transient=False)
+                    self.logger.info(f"Successfully uploaded {file} to Google Drive")
+                    return True
+                except FileNotFoundError:
+                    # Raised by upload_file itself, so there is no separate existence check per attempt
+                    self.logger.error(f"File not found for upload: {file}")
+                    return False
+                except HttpError as e:
+                    status = e.resp.status
+                    rate_limited = is_drive_rate_limit(e)
+                    if rate_limited:
+                        # Drive is throttling us (429, or a 403 whose reason is a rate limit):
+                        # allow fewer uploads at once from now on
+                        await self.upload_admission.shrink()
+                    if rate_limited or status == 503:
+                        # Rate limited or unavailable: honor the server's Retry-After hint when given
+                        retry_after = e.resp.get("retry-after")
+                        delay = int(retry_after) if retry_after and retry_after.isdigit() else self._backoff_delay(attempt)
+                    elif status in (500, 502, 504):
+                        delay = self._backoff_delay(attempt)
+                    elif status == 401:
+                        # Expired token: refresh it in place instead of rebuilding the Drive client
+                        await asyncio.to_thread(drive_saver.refresh_token)
+                        delay = 0
+                    else:
+                        # Other client errors won't succeed on retry
+                        self.logger.error(f"Upload of {file} failed with HTTP {status}, not retrying: {e}")
+                        return False
+                    self.logger.error(f"Upload attempt {attempt + 1} failed for {file}: {e}")
+                except Exception as e:
+                    delay = self._backoff_delay(attempt)
+                    self.logger.error(f"Upload attempt {attempt + 1} failed for {file}: {e}")
+
+                if attempt < self.upload_retries - 1:
+                    self.logger.info(f"Retrying {file} after {delay:.1f} seconds...")
+                    await asyncio.sleep(delay)
+                else:
+                    self.logger.error(f"Failed to upload {file} after {self.upload_retries} attempts")
+        return False
+
     async def upload_files_with_retry(self, drive_saver, files: List[str]) -> List[str]:
-        """Upload files to Google Drive with retry logic."""
+        """Upload files to Google Drive concurrently with retry logic."""
         uploaded_files = []
-        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        yesterday = self._yesterday
 
         try:
-            # Get or create folder for yesterday
-            folder_id = drive_saver.get_folder_id(yesterday)
-            if not folder_id:
-                folder_id = drive_saver.create_folder(yesterday)
-                self.logger.info(f"Created new folder '{yesterday}'")
-
-            for file in files:
-                # Retry upload attempts
-                for attempt in range(self.upload_retries):
-                    try:
-                        if os.path.exists(file):
-                            drive_saver.upload_file(file, folder_id)
-                            uploaded_files.append(file)
-                            self.logger.info(f"Successfully uploaded {file} to Google Drive folder '{yesterday}'")
-                            break
-                    except Exception as e:
-                        self.logger.error(f"Upload attempt {attempt + 1} failed for {file}: {e}")
-                        if attempt < self.upload_retries - 1:
-                            await asyncio.sleep(self.upload_retry_delay)
-                            drive_saver.authenticate()
-                        else:
-                            self.logger.error(f"Failed to upload {file} after {self.upload_retries} attempts")
+            # Get or create folder for yesterday (cached after the first upload). The Drive call and its
+            # retry backoff block, so they run in a thread while other categories keep scraping
+            folder_id = await asyncio.to_thread(drive_saver.ensure_folder, yesterday)
+
+            # Upload all files at once; the admission limit keeps Drive's write quota from being exceeded
+            results = await asyncio.gather(
+                *(self._upload_one(drive_saver, file, folder_id) for file in files)
+            )
+            uploaded_files = [file for file, uploaded in zip(files, results) if uploaded]
+            self.logger.info(f"Uploaded {len(uploaded_files)}/{len(files)} files to Google Drive folder '{yesterday}'")
 
         except Exception as e:
             self.logger.error(f"Error managing Google Drive folder for {yesterday}: {e}")
@@ -154,57 +285,74 @@ class ContractingMainScraper:
             else:
                 self.logger.info("Environment variable CONTRACTING_GCLOUD_KEY_JSON is set.")
 
-            credentials_dict = json.loads(credentials_json)
+            credentials_dict = json_loads(credentials_json)
             drive_saver = SavingOnDriveContracting(credentials_dict)
             drive_saver.authenticate()
         except Exception as e:
             self.logger.error(f"Failed to setup Google Drive: {e}")
             return
 
-        # Break all categories into smaller chunks
-        contractingANDservices_chunks = [
-            list(self.contractingANDservices_data.items())[i : i + self.chunk_size]
-            for i in range(0, len(self.contractingANDservices_data), self.chunk_size)
+        # Work queue of categories; each worker takes the next one as soon as it is free
+        category_queue = asyncio.Queue()
+        for contractingANDservice_name, urls in self.contractingANDservices_data.items():
+            category_queue.put_nowait((contractingANDservice_name, urls))
+
+        # Uploads run in background workers so scraping continues meanwhile; one consumer per
+        # upload slot lets files overlap, and the admission limit can still shrink on a 429
+        upload_queue = asyncio.Queue()
+        uploaders = [
+            asyncio.create_task(self._uploader(drive_saver, upload_queue))
+            for _ in range(self.upload_concurrency)
         ]
 
-        # Control how many tasks can run concurrently
-        semaphore = asyncio.Semaphore(self.max_concurrent_links)
+        try:
+            # The number of workers bounds how many categories are scraped at once
+            workers = [
+                asyncio.create_task(self._category_worker(category_queue, upload_queue))
+                for _ in range(self.max_concurrent_links)
+            ]
+            await asyncio.gather(*workers)
 
-        for chunk_index, chunk in enumerate(contractingANDservices_chunks, 1):
-            self.logger.info(f"Processing chunk {chunk_index}/{len(contractingANDservices_chunks)}")
+            # Wait for the remaining uploads to finish
+            await upload_queue.join()
+        finally:
+            for uploader in uploaders:
+                uploader.cancel()
 
-            tasks = []
-            for contractingANDservice_name, urls in chunk:
-                task = asyncio.create_task(self.scrape_contractingANDservice(contractingANDservice_name, urls, semaphore))
-                tasks.append((contractingANDservice_name, task))
-                await asyncio.sleep(2)  # Slight delay between starting tasks
+    async def _uploader(self, drive_saver, upload_queue: asyncio.Queue):
+        """Consume batches of output files from the queue, upload them and clean them up."""
+        while True:
+            pending_uploads = await upload_queue.get()
+            try:
+                await self.upload_files_with_retry(drive_saver, pending_uploads)
 
-            pending_uploads = []
-            for contractingANDservice_name, task in tasks:
-                try:
-                    card_data = await task
-                    if card_data:
-                        excel_file = await self.save_to_excel(contractingANDservice_name, card_data)
-                        if excel_file:
-                            pending_uploads.append(excel_file)
-                except Exception as e:
-                    self.logger.error(f"Error processing {contractingANDservice_name}: {e}")
+                # Remove local files after upload, all in one trip to a worker thread
+                await asyncio.to_thread(self._cleanup, pending_uploads)
+            except Exception as e:
+                self.logger.error(f"Error uploading {pending_uploads}: {e}")
+            finally:
+                upload_queue.task_done()
 
-            if pending_uploads:
-                await self.upload_files_with_retry(drive_saver, pending_uploads)
+    def _cleanup(self, files: List[str]):
+        """Delete local files, ignoring ones that are already gone."""
+        for file in files:
+            try:
+                Path(file).unlink(missing_ok=True)
+                self.logger.info(f"Cleaned up local file: {file}")
+            except Exception as e:
+                self.logger.error(f"Error cleaning up {file}: {e}")
 
-                # Remove local files after successful upload
-                for file in pending_uploads:
-                    try:
-                        os.remove(file)
-                        self.logger.info(f"Cleaned up local file: {file}")
-                    except Exception as e:
-                        self.logger.error(f"Error cleaning up {file}: {e}")
-
-            # Wait before processing the next chunk
-            if chunk_index < len(contractingANDservices_chunks):
-                self.logger.info(f"Waiting {self.chunk_delay} seconds before next chunk...")
-                await asyncio.sleep(self.chunk_delay)
+    async def _category_worker(self, category_queue: asyncio.Queue, upload_queue: asyncio.Queue):
+        """Scrape and save categories from the queue, handing each file to the upload workers."""
+        while not category_queue.empty():
+            contractingANDservice_name, urls = category_queue.get_nowait()
+            try:
+                table_file = await self.scrape_contractingANDservice(contractingANDservice_name, urls)
+                if table_file:
+                    # Queue the file for upload and move straight on to the next category
+                    await upload_queue.put([table_file])
+            except Exception as e:
+                self.logger.error(f"Error processing {contractingANDservice_name}: {e}")
 
 
 # Entry point: Only runs if file is executed directly (not imported)
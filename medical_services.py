@@ -1,19 +1,27 @@
 # Required libraries for async operations, scraping, data handling, and Google Drive API.
 import asyncio
-import pandas as pd
 import os
-import json
 import logging
+from urllib.parse import urljoin
 from datetime import datetime, timedelta
 from pathlib import Path
 from playwright.async_api import async_playwright
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import socket
 import ssl
-from DetailsScraper import DetailsScraping  # Custom scraper module
+
+# Prefer orjson for parsing JSON, falling back to the standard library
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+from DetailsScraper import DetailsScraping, CHROMIUM_ARGS, block_unneeded_resources  # Custom scraper module
+from ExcelWriter import save_to_excel_async
 
 
 class MedicalServices:
@@ -23,11 +31,12 @@ class MedicalServices:
         self.scopes = ['https://www.googleapis.com/auth/drive']
         self.service = None
         self.parent_folder_id = '1dwoFxJ4F56HIfaUrRk3QufXDE1QlotzA'  # Parent folder on Google Drive
+        self._folder_cache = {}  # Folder IDs already resolved in this run, keyed by folder name
 
         # Scraping setup
         self.url = url
         self.num_pages = num_pages  # Default pages to scrape per brand
-        self.specific_brands = specific_brands or []  # Brands requiring special treatment
+        self.specific_brands = set(specific_brands or [])  # Brands requiring special treatment (set for O(1) lookups)
         self.specific_pages = specific_pages if specific_pages else num_pages
         self.data = []  # Will hold scraped data
 
@@ -40,25 +49,34 @@ class MedicalServices:
         self.temp_dir.mkdir(exist_ok=True)
         self.upload_retries = 3
         self.upload_retry_delay = 15
+        self.resumable_threshold = 5 * 1024 * 1024  # Files above this size use a resumable upload session
+        self.upload_chunksize = 16 * 1024 * 1024  # Chunk size for resumable uploads
         self.page_delay = 3
         self.chunk_delay = 10
+        # Date being scraped ("YYYY-MM-DD"), computed once per run
+        self._yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
 
     def setup_logging(self):
         # Configure logging to show output in console and save to file
-        stream_handler = logging.StreamHandler()
-        file_handler = logging.FileHandler("scraper.log")
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(asctime)s - %(levelname)s - %(message)s",
-            handlers=[stream_handler, file_handler]
-        )
+        # Skipped when another scraper in the process already set up the root logger
+        if not logging.getLogger().handlers:
+            stream_handler = logging.StreamHandler()
+            file_handler = logging.FileHandler("scraper.log", delay=True)  # Opened on the first record
+            logging.basicConfig(
+                level=logging.INFO,
+                format="%(asctime)s - %(levelname)s - %(message)s",
+                handlers=[stream_handler, file_handler]
+            )
         self.logger.setLevel(logging.INFO)
 
     def authenticate(self):
         # Authenticate to Google Drive using the service account
         try:
             creds = Credentials.from_service_account_info(self.credentials_dict, scopes=self.scopes)
-            self.service = build('drive', 'v3', credentials=creds)
+            # One authorized keep-alive connection reused by every Drive call of the run
+            http = AuthorizedHttp(creds, http=httplib2.Http(timeout=60))
+            # Use the bundled discovery document instead of fetching it over the network
+            self.service = build('drive', 'v3', http=http, static_discovery=True, cache_discovery=False)
         except Exception as e:
             self.logger.error(f"Authentication error: {e}")
             raise
@@ -103,55 +121,117 @@ class MedicalServices:
             self.logger.error(f"Error creating folder: {e}")
             raise
 
+    async def _ensure_folder(self, folder_name):
+        # Get or create the named folder under the parent folder, reusing an ID found earlier in the run
+        if folder_name in self._folder_cache:
+            return self._folder_cache[folder_name]
+        # The Drive client is blocking, so run it off the event loop
+        folder_id = await asyncio.to_thread(self.get_folder_id, folder_name)
+        if not folder_id:
+            folder_id = await asyncio.to_thread(self.create_folder, folder_name)
+            self.logger.info(f"Created new folder '{folder_name}'")
+        self._folder_cache[folder_name] = folder_id
+        return folder_id
+
     async def scrape_brands_and_types(self):
         # Launch Playwright browser and navigate to the main URL
         # Scrape all brand links and titles
-        # For each brand:
+        # For each brand (concurrently, sharing the one browser):
         #     - Build paginated URLs
         #     - Scrape data using DetailsScraping class
         #     - Collect only cards if present
         async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
-            await page.goto(self.url)
-            
-            brand_elements = await page.query_selector_all('.styles_itemWrapper__MTzPB a')
-            if not brand_elements:
-                self.logger.info(f"No brand elements found on {self.url}")
-                return self.data
-                
-            for element in brand_elements:
-                title = await element.get_attribute('title')
-                brand_link = await element.get_attribute('href')
-                
-                if brand_link:
-                    base_url = self.url.split('/', 3)[0] + '//' + self.url.split('/', 3)[2]
-                    full_brand_link = base_url + brand_link if brand_link.startswith('/') else brand_link
-                    pages_to_scrape = self.specific_pages if title in self.specific_brands else self.num_pages
-                    
-                    brand_data = []
-                    for page_num in range(1, pages_to_scrape + 1):
-                        paginated_link = f"{full_brand_link}/{page_num}"
-                        try:
-                            details_scraper = DetailsScraping(paginated_link)
-                            card_details = await details_scraper.get_card_details()
-                            if card_details:
-                                brand_data.extend(card_details)
-                            else:
-                                break
-                        except Exception as e:
-                            self.logger.error(f"Error scraping {paginated_link}: {e}")
-                            break
-
-                    self.data.append({
-                        'brand_title': title,
-                        'brand_link': full_brand_link.rsplit('/', 1)[0] + '/{}',
-                        'available_cars': brand_data
-                    })
-                    
-            await browser.close()
+            # The only browser launched in the run; every brand gets a context of it
+            browser = await p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+            try:
+                page = await browser.new_page()
+                # Only the brand links are read, so skip subresources and the full load event
+                await page.route('**/*', block_unneeded_resources)
+                await page.goto(self.url, wait_until='domcontentloaded')
+                try:
+                    await page.wait_for_selector('.styles_itemWrapper__MTzPB a', timeout=10000)
+                except Exception:
+                    pass  # Handled below as "no brand elements"
+
+                brand_elements = await page.query_selector_all('.styles_itemWrapper__MTzPB a')
+                if not brand_elements:
+                    self.logger.info(f"No brand elements found on {self.url}")
+                    return self.data
+
+                brands = []
+                for element in brand_elements:
+                    title = await element.get_attribute('title')
+                    brand_link = await element.get_attribute('href')
+                    if brand_link:
+                        # Resolves root-relative, page-relative and absolute links alike
+                        brands.append((title, urljoin(self.url, brand_link)))
+                await page.close()
+
+                # Scrape brands (and their pages) in parallel; the semaphore bounds open pages overall
+                semaphore = asyncio.BoundedSemaphore(self.max_concurrent_links)
+                results = await asyncio.gather(
+                    *(self._scrape_brand(browser, semaphore, title, link) for title, link in brands),
+                    return_exceptions=True
+                )
+                # gather keeps the results in brand order
+                for (title, _), result in zip(brands, results):
+                    if isinstance(result, Exception):
+                        self.logger.error(f"Error scraping brand {title}: {result}")
+                    else:
+                        self.data.append(result)
+            finally:
+                await browser.close()
             return self.data
 
+    async def _scrape_page(self, context, semaphore, paginated_link):
+        # Scrape one listing page in the brand's context
+        async with semaphore:
+            details_scraper = DetailsScraping(paginated_link, browser=context)
+            return await details_scraper.get_card_details(stop_when_older_than=self._yesterday)
+
+    async def _scrape_brand(self, browser, semaphore, title, full_brand_link):
+        # Scrape one brand in its own browser context: page 1 first, then the rest concurrently
+        pages_to_scrape = self.specific_pages if title in self.specific_brands else self.num_pages
+        paginated_links = [f"{full_brand_link}/{page_num}" for page_num in range(1, pages_to_scrape + 1)]
+        brand_data = []
+
+        if not paginated_links:
+            return {'brand_title': title, 'brand_link': full_brand_link.rsplit('/', 1)[0] + '/{}', 'available_cars': []}
+
+        context = await browser.new_context()
+        try:
+            pages = await asyncio.gather(self._scrape_page(context, semaphore, paginated_links[0]),
+                                         return_exceptions=True)
+            first_page = pages[0]
+            # Listings are newest first: when page 1 is empty, failed or already ends on an older card,
+            # the later pages can't hold anything from yesterday and are never requested
+            more_pages = not isinstance(first_page, Exception) and bool(first_page)
+            if more_pages:
+                last_date = first_page[-1].get('date_published')
+                more_pages = not (last_date and last_date < self._yesterday)
+            if more_pages:
+                pages += await asyncio.gather(
+                    *(self._scrape_page(context, semaphore, link) for link in paginated_links[1:]),
+                    return_exceptions=True
+                )
+        finally:
+            await context.close()
+
+        # Keep the pages in order up to the first empty one (past the brand's last page)
+        for paginated_link, card_details in zip(paginated_links, pages):
+            if isinstance(card_details, Exception):
+                self.logger.error(f"Error scraping {paginated_link}: {card_details}")
+                continue
+            if not card_details:
+                break
+            brand_data.extend(card_details)
+
+        return {
+            'brand_title': title,
+            'brand_link': full_brand_link.rsplit('/', 1)[0] + '/{}',
+            'available_cars': brand_data
+        }
+
     async def save_to_excel(self, category_name: str, brand_data: list) -> str:
         # Create an Excel workbook where each brand has its own sheet
         # Only include cards that were published "yesterday"
@@ -161,32 +241,27 @@ class MedicalServices:
             return None
 
         excel_file = Path(f"{category_name}.xlsx")
-        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-        
+        yesterday = self._yesterday
+
+        # Pick out each brand's cards from yesterday before creating any file
+        sheets = []
+        for brand in brand_data:
+            yesterday_cars = [
+                car for car in brand['available_cars']
+                if car.get('date_published') and car['date_published'].startswith(yesterday)
+            ]
+            if yesterday_cars:
+                sheet_name = "".join(x for x in brand['brand_title'] if x.isalnum())
+                sheets.append((sheet_name, yesterday_cars))
+                self.logger.info(f"Adding sheet for {brand['brand_title']} with {len(yesterday_cars)} entries")
+
+        if not sheets:
+            self.logger.info("No data from yesterday found for any brand")
+            return None
+
         try:
-            with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
-                sheets_created = False
-                
-                for brand in brand_data:
-                    brand_title = brand['brand_title']
-                    cars = brand['available_cars']
-                    
-                    yesterday_cars = [
-                        car for car in cars 
-                        if car.get('date_published') and car['date_published'].split()[0] == yesterday
-                    ]
-                    
-                    if yesterday_cars:
-                        df = pd.DataFrame(yesterday_cars)
-                        sheet_name = "".join(x for x in brand_title if x.isalnum())[:31]
-                        df.to_excel(writer, sheet_name=sheet_name, index=False)
-                        sheets_created = True
-                        self.logger.info(f"Created sheet for {brand_title} with {len(yesterday_cars)} entries")
-                
-                if not sheets_created:
-                    self.logger.info("No data from yesterday found for any brand")
-                    return None
-                
+            # Building the workbook is blocking work, so it runs off the event loop
+            await save_to_excel_async(excel_file, sheets)
             self.logger.info(f"Successfully saved data for {category_name}")
             return str(excel_file)
         except Exception as e:
@@ -207,7 +282,14 @@ class MedicalServices:
                 'name': os.path.basename(file_name),
                 'parents': [folder_id]
             }
-            media = MediaFileUpload(file_name, resumable=True)
+            # Small workbooks go up in a single multipart request; only large ones need a resumable session
+            resumable = os.path.getsize(file_name) > self.resumable_threshold
+            media = MediaFileUpload(
+                file_name,
+                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                chunksize=self.upload_chunksize,
+                resumable=resumable
+            )
             file = self.service.files().create(
                 body=file_metadata,
                 media_body=media,
@@ -228,21 +310,26 @@ class MedicalServices:
         # 6. Clean up local file
         self.temp_dir.mkdir(exist_ok=True)
         try:
-            self.authenticate()
-            yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-            
-            folder_id = self.get_folder_id(yesterday)
-            if not folder_id:
-                folder_id = self.create_folder(yesterday)
-                self.logger.info(f"Created new folder '{yesterday}'")
-
-            brand_data = await self.scrape_brands_and_types()
+            await asyncio.to_thread(self.authenticate)
+            yesterday = self._yesterday
+
+            # Resolve the Drive folder while scraping runs instead of before it
+            folder_task = asyncio.create_task(self._ensure_folder(yesterday))
+
+            try:
+                brand_data = await self.scrape_brands_and_types()
+            except BaseException:
+                # Don't leave the Drive lookup running (or its exception unretrieved) when scraping fails
+                folder_task.cancel()
+                await asyncio.gather(folder_task, return_exceptions=True)
+                raise
+            folder_id = await folder_task
             if brand_data:
                 excel_file = await self.save_to_excel("خدمات طبية", brand_data)
                 if excel_file:
-                    file_id = self.upload_file(excel_file, folder_id)
+                    file_id = await asyncio.to_thread(self.upload_file, excel_file, folder_id)
                     self.logger.info(f"Successfully uploaded file with ID: {file_id}")
-                    os.remove(excel_file)
+                    await asyncio.to_thread(os.remove, excel_file)
                     self.logger.info(f"Cleaned up local file: {excel_file}")
 
         except Exception as e:
@@ -256,7 +343,7 @@ if __name__ == "__main__":
         raise EnvironmentError("SERVICES_GCLOUD_KEY_JSON environment variable not found")
 
     # Parse credentials and initialize MedicalServices
-    credentials_dict = json.loads(credentials_json)
+    credentials_dict = json_loads(credentials_json)
     medical_services = MedicalServices(
         credentials_dict=credentials_dict,
         url="https://www.q84sale.com/ar/services/medical-services",
@@ -1,16 +1,27 @@
 # Import required libraries
 import asyncio
-import pandas as pd
+import csv
 import os
-import json
 import logging
+import random
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple
 from pathlib import Path
+from googleapiclient.errors import HttpError
+from playwright.async_api import async_playwright
+
+# Prefer orjson for parsing JSON, falling back to the standard library
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 # Importing custom modules for scraping and Google Drive upload
-from DetailsScraper import DetailsScraping
+from DetailsScraper import DetailsScraping, CHROMIUM_ARGS
+from RateLimiter import HostRateLimiter
+from ExcelWriter import cell_value, sheet_columns, save_to_excel_async
 from SavingOnDriveServices import SavingOnDriveServices
+from SavingOnDriveBase import is_drive_rate_limit
 
 
 class ServicesMainScraper:
@@ -20,7 +31,7 @@ class ServicesMainScraper:
 
         # Control parameters
         self.chunk_size = 2  # Number of categories to process in each chunk
-        self.max_concurrent_links = 2  # Max concurrent scraping operations
+        self.max_concurrent_links = 2  # Max pages fetched at once per category
 
         # Logging setup
         self.logger = logging.getLogger(__name__)
@@ -29,108 +40,182 @@ class ServicesMainScraper:
         # Temp file directory setup
         self.temp_dir = Path("temp_files")
         self.temp_dir.mkdir(exist_ok=True)
+        self.csv_row_threshold = 50_000  # Categories with more rows than this are saved as CSV instead of .xlsx
 
         # Retry and delay settings
         self.upload_retries = 3
-        self.upload_retry_delay = 15  # seconds
-        self.page_delay = 3  # Delay between page scrapes
-        self.chunk_delay = 10  # Delay between processing chunks
+        self.upload_retry_max_delay = 60  # Upper bound (seconds) for the backoff between upload attempts
+        self.upload_concurrency = 4  # Max files uploaded to Google Drive at the same time
+        self.requests_per_second = 3  # Listing page requests per second allowed to q84sale.com
+        self.rate_limiter = HostRateLimiter(self.requests_per_second)  # Shared by all categories
+        self.chunk_delay_base = 0.5  # Pause between chunks when the site isn't throttling us
+        self.chunk_delay_max = 60  # Upper bound for the pause between chunks
+        self._recent_429_count = 0  # 429/503 responses seen since the last chunk pause
+        self._browser = None  # Chromium shared by every category of a run, see scrape_all_contractingANDservices
+
+        # Date being scraped ("YYYY-MM-DD"), computed once per run instead of per page/card
+        self._yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
 
     def setup_logging(self):
         """Initialize logging configuration."""
-        stream_handler = logging.StreamHandler()  # Logs to console
-        file_handler = logging.FileHandler("scraper.log")  # Logs to file
-
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(asctime)s - %(levelname)s - %(message)s",
-            handlers=[stream_handler, file_handler],
-        )
+        # Only the first scraper in the process configures the root logger; later ones would
+        # just open a scraper.log handle that basicConfig ignores
+        if not logging.getLogger().handlers:
+            stream_handler = logging.StreamHandler()  # Logs to console
+            file_handler = logging.FileHandler("scraper.log", delay=True)  # Logs to file, opened on the first record
+
+            logging.basicConfig(
+                level=logging.INFO,
+                format="%(asctime)s - %(levelname)s - %(message)s",
+                handlers=[stream_handler, file_handler],
+            )
         self.logger.setLevel(logging.INFO)
         print("Logging setup complete.")
 
-    async def scrape_contractingANDservice(self, contractingANDservice_name: str, urls: List[Tuple[str, int]], semaphore: asyncio.Semaphore) -> List[Dict]:
+    async def scrape_contractingANDservice(self, contractingANDservice_name: str, urls: List[Tuple[str, int]]) -> List[Dict]:
         """Scrape data for a single category."""
         self.logger.info(f"Starting to scrape {contractingANDservice_name}")
         card_data = []
-        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        yesterday = self._yesterday
 
-        # Use semaphore to limit concurrent scrapes
-        async with semaphore:
-            for url_template, page_count in urls:
-                for page in range(1, page_count + 1):
-                    url = url_template.format(page)
-                    scraper = DetailsScraping(url)
-                    try:
-                        cards = await scraper.get_card_details()  # Get cards from page
-                        for card in cards:
-                            if card.get("date_published") and card.get("date_published", "").split()[0] == yesterday:
-                                card_data.append(card)  # Filter only yesterday's data
-
-                        await asyncio.sleep(self.page_delay)  # Delay between page scrapes
-                    except Exception as e:
-                        self.logger.error(f"Error scraping {url}: {e}")
-                        continue
+        # Build every page URL up front so all pages can be fetched concurrently
+        urls_to_fetch = [
+            url_template.format(page)
+            for url_template, page_count in urls
+            for page in range(1, page_count + 1)
+        ]
+
+        # Limit how many pages of this category are fetched at once
+        page_semaphore = asyncio.BoundedSemaphore(self.max_concurrent_links)
+
+        async def fetch(url, browser):
+            async with page_semaphore:
+                await self.rate_limiter.acquire()  # Only waits when the per-host budget is used up
+                scraper = DetailsScraping(url, browser=browser, on_throttled=self._record_throttle)
+                # Stop opening card tabs once an unpinned card is older than yesterday
+                return await scraper.get_card_details(stop_when_older_than=self._yesterday)
+
+        if self._browser is not None:
+            # Reuse the run-wide browser; each page still gets its own tab
+            results = await asyncio.gather(*(fetch(url, self._browser) for url in urls_to_fetch), return_exceptions=True)
+        else:
+            async with async_playwright() as p:
+                # Called on its own: one browser for this category, shared by all of its pages
+                browser = await p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+                try:
+                    results = await asyncio.gather(*(fetch(url, browser) for url in urls_to_fetch), return_exceptions=True)
+                finally:
+                    await browser.close()
+
+        for url, cards in zip(urls_to_fetch, results):
+            if isinstance(cards, Exception):
+                self.logger.error(f"Error scraping {url}: {cards}")
+                continue
+            for card in cards:
+                date_published = card.get("date_published")
+                if date_published and date_published.startswith(yesterday):
+                    card_data.append(card)  # Filter only yesterday's data
 
         return card_data
 
+    def _write_csv(self, csv_file: Path, card_data: List[Dict]):
+        """Write card rows to a CSV file in a single streaming pass."""
+        with open(csv_file, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            columns = sheet_columns(card_data)
+            writer.writerow(columns)
+            writer.writerows([cell_value(card.get(column)) for column in columns] for card in card_data)
+
     async def save_to_excel(self, contractingANDservice_name: str, card_data: List[Dict]) -> str:
-        """Save scraped data to an Excel file."""
+        """Save scraped data to an Excel file (or CSV for very large categories)."""
         if not card_data:
             self.logger.info(f"No data to save for {contractingANDservice_name}, skipping Excel file creation.")
             return None
 
-        excel_file = Path(f"{contractingANDservice_name}.xlsx")
+        # Past the threshold the XML of .xlsx costs far more than it is worth; the Drive saver gzips CSV on upload
+        if len(card_data) > self.csv_row_threshold:
+            excel_file = Path(f"{contractingANDservice_name}.csv")
+        else:
+            excel_file = Path(f"{contractingANDservice_name}.xlsx")
         try:
-            df = pd.DataFrame(card_data)
-            df.to_excel(excel_file, index=False)
+            # Build and save the file in a thread so other scraping tasks keep running meanwhile
+            if excel_file.suffix == ".csv":
+                await asyncio.to_thread(self._write_csv, excel_file, card_data)
+            else:
+                await save_to_excel_async(excel_file, [("Sheet1", card_data)])
             self.logger.info(f"Successfully saved data for {contractingANDservice_name}")
             return str(excel_file)
         except Exception as e:
             self.logger.error(f"Error saving Excel file {excel_file}: {e}")
             return None
 
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter for the given (zero-based) retry attempt."""
+        return min(2 ** attempt + random.random(), self.upload_retry_max_delay)
+
+    async def _upload_one(self, drive_saver, file: str, folder_id: str, semaphore: asyncio.Semaphore) -> bool:
+        """Upload a single file from a worker thread, retrying transient failures."""
+        async with semaphore:
+            for attempt in range(self.upload_retries):
+                try:
+                    # The Drive client is blocking, so run it off the event loop. This loop is the only
+                    # retry layer for the upload, so upload_file sends each attempt just once
+                    file_id = await asyncio.to_thread(drive_saver.upload_file, file, folder_id, retry_transient=False)
+                    if not file_id:
+                        raise Exception("Upload returned no file ID")
+                    self.logger.info(f"Successfully uploaded {file} with ID: {file_id}")
+                    return True
+                except FileNotFoundError:
+                    # Raised by upload_file when it opens the file (in its thread), so no separate check is needed
+                    self.logger.error(f"File not found for upload: {file}")
+                    return False
+                except HttpError as e:
+                    status = e.resp.status
+                    if is_drive_rate_limit(e) or status == 503:
+                        # Rate limited or unavailable: honor the server's Retry-After hint when given
+                        retry_after = e.resp.get("retry-after")
+                        delay = int(retry_after) if retry_after and retry_after.isdigit() else self._backoff_delay(attempt)
+                    elif status in (500, 502, 504):
+                        delay = self._backoff_delay(attempt)
+                    elif status == 401:
+                        # Expired token: refresh it in place; other uploads share the same credentials
+                        await asyncio.to_thread(drive_saver.refresh_token)
+                        delay = 0
+                    else:
+                        # Other client errors won't succeed on retry
+                        self.logger.error(f"Upload of {file} failed with HTTP {status}, not retrying: {e}")
+                        return False
+                    self.logger.error(f"Upload attempt {attempt + 1} failed for {file}: {e}")
+                except Exception as e:
+                    delay = self._backoff_delay(attempt)
+                    self.logger.error(f"Upload attempt {attempt + 1} failed for {file}: {e}")
+
+                if attempt < self.upload_retries - 1:
+                    self.logger.info(f"Retrying {file} after {delay:.1f} seconds...")
+                    await asyncio.sleep(delay)
+                else:
+                    self.logger.error(f"Failed to upload {file} after {self.upload_retries} attempts")
+        return False
+
     async def upload_files_with_retry(self, drive_saver, files: List[str]) -> List[str]:
         """Upload files to Google Drive with retry mechanism."""
         uploaded_files = []
-        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        yesterday = self._yesterday
 
         try:
-            self.logger.info(f"Checking local files before upload: {files}")
-            for file in files:
-                self.logger.info(f"File {file} exists: {os.path.exists(file)}, size: {os.path.getsize(file) if os.path.exists(file) else 'N/A'}")
- 
-            # Get or create a folder for yesterday's date
-            folder_id = drive_saver.get_folder_id(yesterday)
+            # Get or create a folder for yesterday's date; the saver caches the ID after the first chunk.
+            # The lookup blocks (and may back off), so it runs in a thread off the event loop
+            folder_id = await asyncio.to_thread(drive_saver.ensure_folder, yesterday)
             if not folder_id:
-                self.logger.info(f"Creating new folder for date: {yesterday}")
-                folder_id = drive_saver.create_folder(yesterday)
-                if not folder_id:
-                    raise Exception("Failed to create or get folder ID")
-                self.logger.info(f"Created new folder '{yesterday}' with ID: {folder_id}")
-
-            # Try uploading each file with retry logic
-            for file in files:
-                for attempt in range(self.upload_retries):
-                    try:
-                        if os.path.exists(file):
-                            file_id = drive_saver.upload_file(file, folder_id)
-                            if not file_id:
-                                raise Exception("Upload returned no file ID")
-                            uploaded_files.append(file)
-                            self.logger.info(f"Successfully uploaded {file} with ID: {file_id}")
-                            break
-                        else:
-                            self.logger.error(f"File not found for upload: {file}")
-                            break
-                    except Exception as e:
-                        self.logger.error(f"Upload attempt {attempt + 1} failed for {file}: {e}")
-                        if attempt < self.upload_retries - 1:
-                            self.logger.info(f"Retrying after {self.upload_retry_delay} seconds...")
-                            await asyncio.sleep(self.upload_retry_delay)
-                            drive_saver.authenticate()  # Re-authenticate before retry
-                        else:
-                            self.logger.error(f"Failed to upload {file} after {self.upload_retries} attempts")
+                raise Exception("Failed to create or get folder ID")
+
+            # Upload all files at once, bounded so Drive's write quota isn't exceeded
+            semaphore = asyncio.Semaphore(self.upload_concurrency)
+            results = await asyncio.gather(
+                *(self._upload_one(drive_saver, file, folder_id, semaphore) for file in files),
+                return_exceptions=True,
+            )
+            uploaded_files = [file for file, uploaded in zip(files, results) if uploaded is True]
 
         except Exception as e:
             self.logger.error(f"Error in upload process: {e}")
@@ -138,6 +223,36 @@ class ServicesMainScraper:
 
         return uploaded_files
 
+    def _record_throttle(self, status: int):
+        """Count a 429/503 response from the site; the next chunk pause grows with the count."""
+        self._recent_429_count += 1
+        self.logger.warning(f"Site answered HTTP {status}; backing off before the next chunk")
+
+    def _chunk_delay(self) -> float:
+        """Pause before the next chunk: short when no throttling was seen, doubling per 429/503."""
+        delay = min(self.chunk_delay_max, self.chunk_delay_base * (2 ** self._recent_429_count))
+        self._recent_429_count = 0
+        return delay
+
+    def _cleanup(self, files: List[str]):
+        """Delete local files, ignoring ones that are already gone."""
+        for file in files:
+            try:
+                Path(file).unlink(missing_ok=True)
+                self.logger.info(f"Cleaned up local file: {file}")
+            except Exception as e:
+                self.logger.error(f"Error cleaning up {file}: {e}")
+
+    async def _scrape_and_save(self, contractingANDservice_name: str, urls: List[Tuple[str, int]]) -> str:
+        """Scrape one category and save it; returns the saved file or None."""
+        try:
+            card_data = await self.scrape_contractingANDservice(contractingANDservice_name, urls)
+            if card_data:
+                return await self.save_to_excel(contractingANDservice_name, card_data)
+        except Exception as e:
+            self.logger.error(f"Error processing {contractingANDservice_name}: {e}")
+        return None
+
     async def scrape_all_contractingANDservices(self):
         """Scrape all categories and handle uploads."""
         self.temp_dir.mkdir(exist_ok=True)
@@ -150,62 +265,55 @@ class ServicesMainScraper:
             else:
                 self.logger.info("Environment variable SERVICES_GCLOUD_KEY_JSON is set.")
 
-            credentials_dict = json.loads(credentials_json)
+            credentials_dict = json_loads(credentials_json)
             drive_saver = SavingOnDriveServices(credentials_dict)
             drive_saver.authenticate()
-            self.logger.info("Testing Drive API access...")
-            try:
-                drive_saver.service.files().get(fileId=drive_saver.parent_folder_id).execute()
-                self.logger.info("Successfully accessed parent folder")
-            except Exception as e:
-                self.logger.error(f"Failed to access parent folder: {e}")
-                return
         except Exception as e:
             self.logger.error(f"Failed to setup Google Drive: {e}")
             return
 
-        # Split tasks into chunks
+        # Split tasks into chunks (the item list is built once, not once per slice)
+        items = list(self.contractingANDservices_data.items())
         contractingANDservices_chunks = [
-            list(self.contractingANDservices_data.items())[i : i + self.chunk_size]
-            for i in range(0, len(self.contractingANDservices_data), self.chunk_size)
+            items[i : i + self.chunk_size]
+            for i in range(0, len(items), self.chunk_size)
         ]
 
-        semaphore = asyncio.Semaphore(self.max_concurrent_links)  # Control concurrency
+        cleanup_tasks = []  # Background deletions of uploaded files
 
-        # Process each chunk one at a time
-        for chunk_index, chunk in enumerate(contractingANDservices_chunks, 1):
-            self.logger.info(f"Processing chunk {chunk_index}/{len(contractingANDservices_chunks)}")
-
-            tasks = []
-            for contractingANDservice_name, urls in chunk:
-                task = asyncio.create_task(self.scrape_contractingANDservice(contractingANDservice_name, urls, semaphore))
-                tasks.append((contractingANDservice_name, task))
-                await asyncio.sleep(2)
-
-            pending_uploads = []
-            for contractingANDservice_name, task in tasks:
-                try:
-                    card_data = await task
-                    if card_data:
-                        excel_file = await self.save_to_excel(contractingANDservice_name, card_data)
-                        if excel_file:
-                            pending_uploads.append(excel_file)
-                except Exception as e:
-                    self.logger.error(f"Error processing {contractingANDservice_name}: {e}")
-
-            if pending_uploads:
-                await self.upload_files_with_retry(drive_saver, pending_uploads)
-
-                for file in pending_uploads:
-                    try:
-                        os.remove(file)  # Cleanup
-                        self.logger.info(f"Cleaned up local file: {file}")
-                    except Exception as e:
-                        self.logger.error(f"Error cleaning up {file}: {e}")
-
-            if chunk_index < len(contractingANDservices_chunks):
-                self.logger.info(f"Waiting {self.chunk_delay} seconds before next chunk...")
-                await asyncio.sleep(self.chunk_delay)
+        # Launch Chromium once for the whole run instead of once per category
+        playwright = await async_playwright().start()
+        self._browser = await playwright.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+        try:
+            # Process each chunk one at a time
+            for chunk_index, chunk in enumerate(contractingANDservices_chunks, 1):
+                self.logger.info(f"Processing chunk {chunk_index}/{len(contractingANDservices_chunks)}")
+
+                # Each category saves its file as soon as its own scrape ends, so the chunk's files
+                # are written concurrently instead of one after another
+                saved_files = await asyncio.gather(*(
+                    self._scrape_and_save(contractingANDservice_name, urls)
+                    for contractingANDservice_name, urls in chunk
+                ))
+                pending_uploads = [excel_file for excel_file in saved_files if excel_file]
+
+                if pending_uploads:
+                    await self.upload_files_with_retry(drive_saver, pending_uploads)
+
+                    # Delete the files in the background so the next chunk starts right away
+                    cleanup_tasks.append(asyncio.create_task(asyncio.to_thread(self._cleanup, list(pending_uploads))))
+
+                if chunk_index < len(contractingANDservices_chunks):
+                    delay = self._chunk_delay()
+                    self.logger.info(f"Waiting {delay:.1f} seconds before next chunk...")
+                    await asyncio.sleep(delay)
+        finally:
+            await self._browser.close()
+            self._browser = None
+            await playwright.stop()
+
+        # Make sure every local file is gone before the run ends
+        await asyncio.gather(*cleanup_tasks)
 
 
 if __name__ == "__main__":